@@ -0,0 +1,160 @@
+"""Benchmark the Python threaded writer (randquik.fill) like the C CLI.
+
+Run `python benchmarks/pyfill.py --help` from the repository root. The
+default writes to /dev/null; --sweep measures a sparse range of sizes.
+"""
+
+import argparse
+import ctypes
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from randquik.fill import BLOCK_SIZE, FdProducer, format_worker_stats_report
+
+# Colored and plain summary templates, chosen once by stderr.isatty() so the
+# non-tty path never builds escape codes only to strip them again.
+_SUMMARY_TTY = (
+    "\033[1m{gb:8.3f} GB\033[0m to {out} in \033[1m{dur:7.3f} s\033[0m — "
+    "\033[32;1m{speed:6.2f} GB/s\033[0m ({workers} workers, {rounds} rounds)"
+)
+_SUMMARY_PLAIN = (
+    "{gb:8.3f} GB to {out} in {dur:7.3f} s — "
+    "{speed:6.2f} GB/s ({workers} workers, {rounds} rounds)"
+)
+
+
+def sparse_range(n, keep=16, points=40):
+    """All of 1..keep, then geometrically spaced values up to n inclusive."""
+    if n <= keep:
+        return list(range(1, n + 1))
+    arr = np.unique(
+        np.round(
+            np.concatenate([np.arange(1, keep + 1), np.geomspace(keep + 1, n, points)])
+        ).astype(np.int64)
+    )
+    return list(arr)
+
+
+class ProgressDisplay:
+    """Background thread that paints bytes-written progress on stderr.
+
+    status is a ctypes.c_uint64: the producer stores into it and this
+    thread samples .value, a plain 8-byte load with no dict machinery.
+    """
+
+    def __init__(self, status: ctypes.c_uint64, total: int, interval=0.1):
+        self.status = status
+        self.total = total
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        sys.stderr.write("\r\033[K")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            written = self.status.value
+            sys.stderr.write(
+                f"\r{1e-9 * written:7.2f} of {1e-9 * self.total:.2f} GB written\033[K"
+            )
+            sys.stderr.flush()
+
+
+@dataclass
+class RunResult:
+    size: int
+    duration: float
+    workers: int
+    rounds: int
+    out: str
+
+    @property
+    def speed(self):
+        return self.size / self.duration if self.duration else 0.0
+
+    def print_summary(self):
+        template = _SUMMARY_TTY if sys.stderr.isatty() else _SUMMARY_PLAIN
+        msg = template.format(
+            gb=1e-9 * self.size,
+            out=self.out,
+            dur=self.duration,
+            speed=1e-9 * self.speed,
+            workers=self.workers,
+            rounds=self.rounds,
+        )
+        print(msg, file=sys.stderr)
+
+
+class _ReportingProducer(FdProducer):
+    """FdProducer that mirrors its progress into a shared counter."""
+
+    def __init__(self, *args, status: ctypes.c_uint64, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.status = status
+
+    def _write_span(self, start, nbytes):
+        super()._write_span(start, nbytes)
+        self.status.value += nbytes
+
+
+def run_once(out, size, key, *, workers, rounds, block_size, profile=False):
+    fd = os.open(out, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    status = ctypes.c_uint64(0)
+    try:
+        prod = _ReportingProducer(
+            fd, size, key,
+            workers=workers, rounds=rounds, block_size=block_size,
+            profile=profile, status=status,
+        )
+        with ProgressDisplay(status, size):
+            t0 = perf_counter()
+            prod.run()
+            duration = perf_counter() - t0
+    finally:
+        os.close(fd)
+    result = RunResult(size, duration, workers, rounds, out)
+    result.print_summary()
+    if profile:
+        print(format_worker_stats_report(prod.worker_stats, prod.consumer_stats), file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--size", type=float, default=10e9, help="bytes to write (default 10 GB)")
+    parser.add_argument("-o", "--out", default="/dev/null", help="output file (default /dev/null)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("-r", "--rounds", type=int, default=20)
+    parser.add_argument("-b", "--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--sweep", action="store_true", help="sweep a sparse range of sizes up to -n")
+    parser.add_argument("--profile", action="store_true", help="collect per-thread timing stats")
+    args = parser.parse_args()
+
+    key = bytes(32)  # fixed seed for repeatable benchmarks
+    sizes = sparse_range(int(args.size)) if args.sweep else [int(args.size)]
+    for size in sizes:
+        run_once(
+            args.out, size, key,
+            workers=args.workers, rounds=args.rounds,
+            block_size=args.block_size, profile=args.profile,
+        )
+        time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    main()
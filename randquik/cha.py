@@ -28,6 +28,14 @@ ffi.cdef(
     void cha_init(cha_ctx* ctx, const uint8_t* key, const uint8_t* iv, unsigned rounds);
     void cha_wipe(cha_ctx* ctx);
     int cha_update(cha_ctx* ctx, uint8_t* out, uint64_t outlen);
+    void cha_seek(cha_ctx* ctx, int64_t offset);
+    int64_t cha_tell(cha_ctx* ctx);
+
+    int cha_fill_ring(uint8_t* ring, uint64_t block_size, uint64_t num_slots,
+                      uint8_t* ready, uint64_t flag_stride,
+                      uint64_t* done_blkno, int* quit, uint64_t num_blocks,
+                      const uint8_t key[32], const uint8_t iv[16],
+                      uint64_t counter_step, unsigned rounds, unsigned workers);
     """
 )
 libname = "librandquik-chacha20.so"
@@ -83,6 +91,14 @@ class Cha:
         lib.cha_update(self.ctx, outbuf, outlen)
         return out
 
+    def seek(self, offset: int):
+        """Move by offset bytes (may be negative) in the random stream."""
+        lib.cha_seek(self.ctx, offset)
+
+    def tell(self) -> int:
+        """Current byte position in the stream (assuming initial counter 0)."""
+        return lib.cha_tell(self.ctx)
+
 
 def generate_into(
     out: bytearray | memoryview | Any,
@@ -90,15 +106,30 @@ def generate_into(
     iv: bytes | Any = bytes(16),
     *,
     rounds=20,
+    offset=0,
 ):
-    """Fill in random bytes into an existing array (buffer interface)"""
+    """Fill in random bytes into an existing array (buffer interface).
+
+    offset skips that many bytes into the keystream without generating
+    them, so a partial region can be produced directly at its final
+    location rather than via a temporary buffer and copy.
+    """
     key, iv = _processKeys(key, iv)
     outbuf, outlen = _processBuffer(out)
-    lib.cha_generate(outbuf, outlen, key, iv, rounds)
+    if offset:
+        ctx = ffi.new("cha_ctx*")
+        lib.cha_init(ctx, key, iv, rounds)
+        lib.cha_seek(ctx, offset)
+        lib.cha_update(ctx, outbuf, outlen)
+        lib.cha_wipe(ctx)
+    else:
+        lib.cha_generate(outbuf, outlen, key, iv, rounds)
     return out
 
 
-def generate(outlen: int, key: bytes | Any, iv: bytes | Any = bytes(16), *, rounds=20):
+def generate(
+    outlen: int, key: bytes | Any, iv: bytes | Any = bytes(16), *, rounds=20, offset=0
+):
     """Return a bytearray of random bytes"""
     assert outlen >= 0
-    return generate_into(bytearray(outlen), key, iv, rounds=rounds)
+    return generate_into(bytearray(outlen), key, iv, rounds=rounds, offset=offset)
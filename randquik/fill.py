@@ -0,0 +1,749 @@
+"""Threaded file filling with ChaCha20 randomness.
+
+A Python port of the CLI's multithreaded writer (src/cli.c): worker threads
+generate large blocks of keystream into a ring of slots while the calling
+thread writes completed blocks to the output in order. cffi releases the
+GIL for the duration of every C call, so keystream generation runs truly
+parallel across worker threads. Given the same key, the output is
+identical to `generate(count, key, bytes(8) + b"RandQuik")` and to the
+CLI's output with the same seed.
+"""
+
+import ctypes
+import mmap
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as _futures_wait
+from dataclasses import dataclass
+from time import perf_counter_ns, sleep
+
+import numpy as np
+
+from randquik.cha import ffi, generate_into, lib
+
+BLOCK_SIZE = 1 << 21  # 2 MiB seems optimal for speed, same as the CLI
+CHA_BLOCK = 64  # ChaCha20 keystream block
+DEFAULT_IV_TAIL = b"RandQuik"  # low 8 bytes hold the block counter
+# Fast-path retries before yielding to the OS scheduler; tune with e.g.
+# RANDQUIK_SPIN=128 without touching call sites
+SPIN = int(os.environ.get("RANDQUIK_SPIN", "100"))
+PARK = 50e-6  # sleep between retries once spinning has failed
+CACHE_LINE = 64  # stride between slot flags so cores don't share lines
+TARGET_BUFFER_NS = 10_000_000  # ring sized to hold ~10 ms of crypto output
+MAX_RING_BYTES = 32 << 20
+# Force profiled runs without touching call sites, e.g. RANDQUIK_PROFILE=1
+PROFILE = os.environ.get("RANDQUIK_PROFILE", "0") != "0"
+
+
+def _make_nonces(num_blocks, counters_per_block):
+    """Precompute all per-block IVs as rows of one contiguous uint8 array.
+
+    Row n holds the 64-bit little-endian keystream counter for block n plus
+    the fixed tail, so workers index a row instead of running int.to_bytes
+    and a bytes concat per block.
+    """
+    nonces = np.zeros((num_blocks, 16), dtype=np.uint8)
+    counters = np.arange(num_blocks, dtype="<u8") * counters_per_block
+    nonces[:, :8] = counters.view(np.uint8).reshape(-1, 8)
+    nonces[:, 8:] = np.frombuffer(DEFAULT_IV_TAIL, dtype=np.uint8)
+    return nonces
+
+
+def _ring_slots(workers, block_size, key, rounds):
+    """Pick a power-of-two slot count that buffers ~10 ms of generation.
+
+    A fixed multiple of workers starves the ring when the sink stalls
+    briefly and wastes memory when crypto is the bottleneck; timing one
+    block tells how much one buffered slot is actually worth.
+    """
+    floor = 1 << (workers + 1).bit_length()
+    probe = bytearray(block_size)
+    t0 = perf_counter_ns()
+    generate_into(probe, key, bytes(16), rounds=rounds)
+    dt = perf_counter_ns() - t0 or 1
+    want = TARGET_BUFFER_NS * workers // dt
+    cap = max(floor, MAX_RING_BYTES // block_size)
+    n = min(max(want, floor), cap)
+    return 1 << (n.bit_length() - 1)  # round down, stays within the cap
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool():
+    """Long-lived executor shared by the pwrite producers in this process.
+
+    Spawning threads costs pthread_create plus interpreter bookkeeping per
+    run, which dominates small fills; a repeat run reuses the same OS
+    threads with their caches still warm. Only safe for workers with no
+    dependencies between them (pwrite/mmap workers, which just drain their
+    own batches): a run asking for more such workers than pool threads
+    completes with less parallelism. The ring producer must not use the
+    pool — its workers wait on slots freed in block order, so a queued
+    worker's blocks would deadlock the running ones.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 4, thread_name_prefix="randquik"
+            )
+        return _pool
+
+
+def _guarded(producer, target, *args):
+    """Run one worker; on failure record the error and stop the whole run.
+
+    Without this a raised worker dies silently: it never publishes its
+    blocks, the consumer waits on them forever, and run() would report the
+    full count as written. The recorded error is re-raised by run().
+    """
+    try:
+        target(*args)
+    except BaseException as e:  # noqa: BLE001 - forwarded to run()'s caller
+        producer._errors.append(e)
+        producer.stop()
+
+
+def _first_touch(buf):
+    """Fault in every page of buf from the calling thread.
+
+    With the kernel's first-touch policy this places the pages on the
+    calling (pinned) thread's own NUMA node and keeps the page faults out
+    of the timed hot loop.
+    """
+    ctypes.memset((ctypes.c_char * len(buf)).from_buffer(buf), 0, len(buf))
+
+
+def _pin_thread(index):
+    """Best-effort pin of the calling thread to a single core (Linux only).
+
+    Keeps the scheduler from bouncing hot threads between cores, which
+    costs cache and TLB refills. index picks a core round-robin from the
+    process's allowed set; index 0 is reserved for the consumer.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cores[index % len(cores)]})
+    except OSError:
+        pass
+
+
+def _build_worker(profile, *, setup=(), wait=(), batch="self._worker_batch(base, n)"):
+    """Generate a worker loop from the one canonical template.
+
+    The profiled variant is the same loop with timing statements baked in,
+    so neither function carries per-iteration profile branches and there is
+    a single body to maintain.
+    """
+    lines = [
+        "def _worker(self, wid):",
+        "    if self.pin:",
+        "        _pin_thread(wid + 1)",
+        *(f"    {line}" for line in setup),
+    ]
+    if profile:
+        lines += [
+            "    stats = self.worker_stats[wid]",
+            "    t0 = perf_counter_ns()",
+        ]
+    lines += [
+        # Static partition: worker wid owns every workers-th batch, so
+        # claiming a batch is pure local arithmetic with no shared state
+        "    step = self.claim_batch",
+        "    nblocks = self.num_blocks",
+        "    for base in range(wid * step, nblocks, self.workers * step):",
+        "        n = min(step, nblocks - base)",
+        *(f"        {line}" for line in wait),
+    ]
+    if profile:
+        lines += [
+            "        t1 = perf_counter_ns()",
+            f"        {batch}",
+            "        t2 = perf_counter_ns()",
+            "        stats.wait_ns += t1 - t0",
+            "        stats.crypto_ns += t2 - t1",
+            "        stats.blocks += n",
+            "        t0 = t2",
+        ]
+    else:
+        lines.append(f"        {batch}")
+    namespace = {
+        "_pin_thread": _pin_thread,
+        "_first_touch": _first_touch,
+        "perf_counter_ns": perf_counter_ns,
+    }
+    exec("\n".join(lines), namespace)  # noqa: S102 - static template above
+    return namespace["_worker"]
+
+
+class _Ctrl(ctypes.Structure):
+    """Control header shared with the C pool, one word per cache line.
+
+    done_blkno is stored by the consumer and loaded by every C worker;
+    quit only ever transitions 0 to 1. Padding keeps the two on separate
+    lines so a done_blkno store does not invalidate the line the workers
+    poll for quit.
+    """
+
+    _fields_ = [
+        ("done_blkno", ctypes.c_uint64),
+        ("_pad0", ctypes.c_uint8 * (CACHE_LINE - 8)),
+        ("quit", ctypes.c_int),
+        ("_pad1", ctypes.c_uint8 * (CACHE_LINE - 4)),
+    ]
+
+
+@dataclass
+class WorkerStats:
+    blocks: int = 0
+    crypto_ns: int = 0
+    wait_ns: int = 0
+
+    @property
+    def crypto_time(self):
+        return self.crypto_ns * 1e-9
+
+    @property
+    def wait_time(self):
+        return self.wait_ns * 1e-9
+
+
+@dataclass
+class ConsumerStats:
+    blocks: int = 0
+    write_ns: int = 0
+    wait_ns: int = 0
+
+    @property
+    def write_time(self):
+        return self.write_ns * 1e-9
+
+    @property
+    def wait_time(self):
+        return self.wait_ns * 1e-9
+
+
+def format_worker_stats_report(workers, consumer):
+    """Human-readable per-thread timing breakdown for profiled runs."""
+
+    def ms(ns):
+        return f"{ns / 1_000_000:8.1f} ms"
+
+    lines = [
+        f"  worker {i}: {w.blocks:6d} blocks  crypto {ms(w.crypto_ns)}  wait {ms(w.wait_ns)}"
+        for i, w in enumerate(workers)
+    ]
+    lines.append(
+        f"  consumer: {consumer.blocks:6d} blocks  write  {ms(consumer.write_ns)}  wait {ms(consumer.wait_ns)}"
+    )
+    return "\n".join(lines)
+
+
+class FdProducer:
+    """Fill a file descriptor with a key-determined random stream.
+
+    Each worker thread owns a static strided set of block batches and
+    generates keystream into ring slots; run() writes finished blocks to
+    the fd in order. For seekable
+    outputs each block is written with os.pwrite at its known offset so the
+    kernel never serializes on the shared file position; pipes fall back to
+    plain sequential os.write.
+    """
+
+    def __init__(self, fd, count, key, *, workers=4, rounds=20, block_size=BLOCK_SIZE, profile=False, pin=True):
+        assert block_size % CHA_BLOCK == 0
+        self.fd = fd
+        self.count = count
+        self.key = key
+        self.rounds = rounds
+        self.workers = workers
+        self.profile = profile or PROFILE
+        self.pin = pin
+        self.block_size = block_size
+        self.num_blocks = -(-count // block_size)
+        # Power of two so the per-block slot lookup is a mask, not a modulo
+        self.num_slots = _ring_slots(workers, block_size, key, rounds)
+        self._slot_mask = self.num_slots - 1
+        ring_bytes = self.num_slots * block_size
+        if hasattr(os, "memfd_create"):
+            # Ring lives in a memfd so the consumer can sendfile from it
+            # directly, skipping the userspace-to-pagecache copy of write
+            self._buf_fd = os.memfd_create("randquik-ring", os.MFD_CLOEXEC)
+            os.ftruncate(self._buf_fd, ring_bytes)
+            self._buf = mmap.mmap(self._buf_fd, ring_bytes)
+        else:
+            self._buf_fd = None
+            self._buf = bytearray(ring_bytes)
+        # sendfile into a FIFO or socket splices the ring pages in by
+        # reference, so the reader would see slots already reused by the
+        # workers; only copying writes are safe for those destinations
+        mode = os.fstat(fd).st_mode
+        self._sendfile = self._buf_fd is not None and not (
+            stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)
+        )
+        self._view = memoryview(self._buf)
+        # The ring is coordinated without locks: the GIL makes single element
+        # stores atomic, so the ready flags act as release/acquire publishes
+        # between threads. Each flag sits on its own cache line so a worker
+        # publishing one slot does not invalidate the line the consumer is
+        # polling for another.
+        self.ready = (ctypes.c_uint8 * (self.num_slots * CACHE_LINE))()
+        # Each worker owns a static strided set of contiguous batches, so
+        # claims need no shared counter at all. A power-of-two batch divides
+        # num_slots, keeping every batch one contiguous span of the ring.
+        n = max(1, self.num_slots // (2 * workers))
+        self.claim_batch = 1 << (n.bit_length() - 1)
+        self.done_blkno = 0  # next block the consumer will write
+        # The C pool generates without per-block Python work; Python worker
+        # threads remain for profiling and as a fallback. The nonce table
+        # and batch views only serve the Python workers, so a C-pool run
+        # skips building them (the table is 16 bytes per block).
+        self.use_cpool = not self.profile and hasattr(lib, "cha_fill_ring")
+        if not self.use_cpool:
+            span = self.claim_batch * block_size
+            self._batch_views = [
+                self._view[o : o + span] for o in range(0, ring_bytes, span)
+            ]
+            self._nonces = _make_nonces(self.num_blocks, block_size // CHA_BLOCK)
+        # Event.is_set is a single C-level load with no locking; checks are
+        # kept off the spin fast path so the common case pays nothing
+        self._quit_ev = threading.Event()
+        self._errors = []  # worker exceptions, re-raised by run()
+        # Control header shared with the C worker pool (plain GIL-atomic
+        # stores on the Python side, atomic loads on the C side)
+        self._ctrl = _Ctrl()
+        # Consumer parking uses an eventfd counting semaphore where
+        # available: workers post one credit per published block, so a wake
+        # is one 8-byte write instead of timed-sleep polling. Workers wait
+        # for free slots by watching done_blkno (claims are unordered across
+        # workers, so slot credits cannot be consumed in claim order).
+        self._use_eventfd = not self.use_cpool and hasattr(os, "eventfd")
+        if self._use_eventfd:
+            self._data_ev = os.eventfd(0, os.EFD_SEMAPHORE | os.EFD_CLOEXEC)
+        self.worker_stats = [WorkerStats() for _ in range(workers)]
+        self.consumer_stats = ConsumerStats()
+        try:
+            self._file_offset = os.lseek(fd, 0, os.SEEK_CUR)
+        except OSError:
+            self._file_offset = None  # pipe or other non-seekable output
+
+    def _wait_slot(self, blkno):
+        """Wait until the ring slot for blkno is free; False if quitting."""
+        spins = SPIN
+        while self.done_blkno + self.num_slots <= blkno:
+            spins -= 1
+            if spins > 0:
+                sleep(0)
+            elif self._quit_ev.is_set():
+                return False
+            else:
+                sleep(PARK)
+        return True
+
+    def _worker_batch(self, base, n):
+        """Fill the batch's contiguous ring span with one keystream call."""
+        slot = base & self._slot_mask
+        buf = self._batch_views[slot // self.claim_batch]
+        if n != self.claim_batch:  # short tail batch of the whole run
+            buf = buf[: n * self.block_size]
+        generate_into(buf, self.key, self._nonces[base], rounds=self.rounds)
+        ready = self.ready
+        for i in range(n):  # atomic publishes; the consumer polls these
+            ready[(slot + i) * CACHE_LINE] = 1
+        if self._use_eventfd:
+            os.eventfd_write(self._data_ev, n)
+
+    _worker_wait = (
+        "if not self._wait_slot(base + n - 1):",
+        "    return",
+    )
+    _worker_fast = _build_worker(False, wait=_worker_wait)
+    _worker_profile = _build_worker(True, wait=_worker_wait)
+
+    def _run_cpool(self):
+        """Drive the whole worker pool with one C call; releases the GIL."""
+        key = memoryview(self.key)
+        ret = lib.cha_fill_ring(
+            ffi.from_buffer(self._buf),
+            self.block_size,
+            self.num_slots,
+            ffi.from_buffer(self.ready),
+            CACHE_LINE,
+            ffi.cast("uint64_t *", ctypes.addressof(self._ctrl)),
+            ffi.cast("int *", ctypes.addressof(self._ctrl) + _Ctrl.quit.offset),
+            self.num_blocks,
+            ffi.from_buffer(key),
+            bytes(8) + DEFAULT_IV_TAIL,
+            self.block_size // CHA_BLOCK,
+            self.rounds,
+            self.workers,
+        )
+        if ret != 0:
+            # pthread_create failed; without this the consumer would wait
+            # forever for blocks that no thread is producing
+            raise OSError("cha_fill_ring could not start its worker threads")
+
+    def _write_span(self, start, nbytes):
+        """Write the ring span [start, start+nbytes) to the fd.
+
+        With a memfd-backed ring, sendfile moves the bytes to the target
+        entirely in kernel space; targets that reject it fall back to the
+        ordinary (copying) gather write. FIFOs and sockets never use
+        sendfile at all: it would splice the ring pages in by reference,
+        and the workers reuse those slots before a reader is guaranteed to
+        have drained them, so only a copy is safe.
+        """
+        if self._sendfile:
+            offset = start
+            end = start + nbytes
+            try:
+                while offset < end:
+                    offset += os.sendfile(self.fd, self._buf_fd, offset, end - offset)
+                if self._file_offset is not None:
+                    self._file_offset += nbytes
+                return
+            except OSError:
+                self._sendfile = False  # e.g. the target fd lacks splice support
+                # Resend only what sendfile did not already move
+                if self._file_offset is not None:
+                    self._file_offset += offset - start
+                start, nbytes = offset, end - offset
+        self._write_iov([self._view[start : start + nbytes]])
+
+    def _write_iov(self, iov):
+        """Gather-write a list of buffers, positioned when the fd is seekable."""
+        offset = self._file_offset
+        while iov:
+            if offset is None:
+                written = os.writev(self.fd, iov)
+            else:
+                written = os.pwritev(self.fd, iov, offset)
+                offset += written
+            # Drop whatever was fully written; short writes are rare
+            while iov and written >= len(iov[0]):
+                written -= len(iov[0])
+                iov = iov[1:]
+            if iov and written:
+                iov = [iov[0][written:], *iov[1:]]
+        if offset is not None:
+            self._file_offset = offset
+
+    def run(self):
+        """Start the workers and write all blocks to the fd in order."""
+        # Dedicated threads rather than the shared pool: the static
+        # partition needs every worker live at once, and a capped pool
+        # would park running workers in _wait_slot forever waiting for
+        # blocks owned by tasks still queued behind them
+        if self.use_cpool:
+            threads = [threading.Thread(target=_guarded, args=(self, self._run_cpool))]
+        else:
+            target = self._worker_profile if self.profile else self._worker_fast
+            threads = [
+                threading.Thread(target=_guarded, args=(self, target, i))
+                for i in range(self.workers)
+            ]
+        for t in threads:
+            t.start()
+        stats = self.consumer_stats
+        t0 = perf_counter_ns()
+        remaining = self.count
+        prev_affinity = None
+        if self.pin and hasattr(os, "sched_getaffinity"):
+            prev_affinity = os.sched_getaffinity(0)
+            _pin_thread(0)  # keep the consumer on its own core
+        try:
+            # Hot loop state as locals: LOAD_FAST instead of an attribute
+            # lookup per access, several accesses per iteration
+            ready = self.ready
+            flags_base = ctypes.addressof(ready)
+            block_size = self.block_size
+            num_slots = self.num_slots
+            num_blocks = self.num_blocks
+            slot_mask = self._slot_mask
+            quit_set = self._quit_ev.is_set
+            use_eventfd = self._use_eventfd
+            data_ev = self._data_ev if use_eventfd else None
+            write_span = self._write_span
+            ctrl = self._ctrl
+            blkno = 0
+            while blkno < num_blocks:
+                slot = blkno & slot_mask
+                flag = slot * CACHE_LINE
+                spins = SPIN
+                while not ready[flag]:
+                    spins -= 1
+                    if spins > 0:
+                        sleep(0)
+                    elif quit_set():
+                        break
+                    elif use_eventfd:
+                        os.eventfd_read(data_ev)
+                    else:
+                        sleep(PARK)
+                if not ready[flag]:
+                    break  # only a quit can leave the wait unsatisfied
+                t1 = perf_counter_ns()
+                stats.wait_ns += t1 - t0
+                # Gather every consecutive ready slot, following the ring
+                # around its wrap, and commit them all in one pass
+                max_n = min(num_slots, num_blocks - blkno)
+                n = 1
+                while n < max_n and ready[((slot + n) & slot_mask) * CACHE_LINE]:
+                    n += 1
+                head = min(n, num_slots - slot)  # blocks before the wrap
+                nbytes = min(n * block_size, remaining)
+                head_bytes = min(head * block_size, nbytes)
+                write_span(slot * block_size, head_bytes)
+                if nbytes > head_bytes:
+                    write_span(0, nbytes - head_bytes)
+                remaining -= nbytes
+                t0 = perf_counter_ns()
+                stats.write_ns += t0 - t1
+                stats.blocks += n
+                # C-level clears of the whole flag spans (padding included)
+                ctypes.memset(flags_base + slot * CACHE_LINE, 0, head * CACHE_LINE)
+                if n > head:
+                    ctypes.memset(flags_base, 0, (n - head) * CACHE_LINE)
+                blkno += n
+                self.done_blkno = blkno  # atomic release of the slots
+                ctrl.done_blkno = blkno  # same, for the C pool
+        finally:
+            self.stop()
+            for t in threads:
+                t.join()
+            if prev_affinity is not None:
+                os.sched_setaffinity(0, prev_affinity)
+            if self._use_eventfd:
+                self._use_eventfd = False
+                os.close(self._data_ev)
+            self.close()
+        if self._errors:
+            raise self._errors[0]
+        return self.count - remaining
+
+    def close(self):
+        """Release the ring views and backing memory deterministically."""
+        if self._buf is None:
+            return
+        for v in getattr(self, "_batch_views", ()):
+            v.release()
+        self._view.release()
+        if self._buf_fd is not None:
+            self._buf.close()
+            os.close(self._buf_fd)
+            self._buf_fd = None
+        self._buf = None
+
+    def stop(self):
+        """Terminate all threads; spinning or parked threads notice the event."""
+        self._quit_ev.set()
+        self._ctrl.quit = 1
+        if self._use_eventfd:
+            # Flood the semaphore so a parked consumer wakes up
+            os.eventfd_write(self._data_ev, 1 << 30)
+
+
+class FdPwriteProducer:
+    """Fill a regular file by letting workers pwrite their blocks directly.
+
+    Positioned writes need no ordering, so there is no ring buffer and no
+    consumer thread: each worker generates into a private buffer and writes
+    at the block's known offset. Throughput is simply min(aggregate crypto
+    bandwidth, disk bandwidth).
+    """
+
+    FADVISE_INTERVAL = 64  # blocks between page-cache housekeeping
+
+    def __init__(self, fd, count, key, *, workers=4, rounds=20, block_size=BLOCK_SIZE, profile=False, pin=True):
+        assert block_size % CHA_BLOCK == 0
+        self.fd = fd
+        self.count = count
+        self.key = key
+        self.rounds = rounds
+        self.workers = workers
+        self.profile = profile or PROFILE
+        self.pin = pin
+        self.block_size = block_size
+        self.num_blocks = -(-count // block_size)
+        self.claim_batch = 4
+        self._fadvise = hasattr(os, "posix_fadvise")
+        self._nonces = _make_nonces(self.num_blocks, block_size // CHA_BLOCK)
+        self._quit_ev = threading.Event()
+        self._errors = []  # worker exceptions, re-raised by run()
+        self.start_offset = os.lseek(fd, 0, os.SEEK_CUR)
+        self.worker_stats = [WorkerStats() for _ in range(workers)]
+        self.consumer_stats = ConsumerStats()  # filled from worker write times
+
+    def _worker_batch(self, base, n, buf):
+        """Generate a whole batch with one C call, then pwrite it in place."""
+        end = min((base + n) * self.block_size, self.count)
+        view = memoryview(buf)[: end - base * self.block_size]
+        generate_into(view, self.key, self._nonces[base], rounds=self.rounds)
+        offset = self.start_offset + base * self.block_size
+        while view:
+            written = os.pwrite(self.fd, view, offset)
+            offset += written
+            view = view[written:]
+        interval = self.FADVISE_INTERVAL
+        if self._fadvise and base % interval == 0 and base > interval:
+            # Drop clean page cache well behind the write front; the output
+            # is never read back, so caching it only evicts useful pages
+            os.posix_fadvise(
+                self.fd,
+                self.start_offset,
+                (base - interval) * self.block_size,
+                os.POSIX_FADV_DONTNEED,
+            )
+
+    _worker_setup = (
+        "buf = bytearray(self.claim_batch * self.block_size)",
+        "_first_touch(buf)",
+    )
+    _worker_wait = (
+        "if self._quit_ev.is_set():",
+        "    return",
+    )
+    _worker_fast = _build_worker(
+        False, setup=_worker_setup, wait=_worker_wait, batch="self._worker_batch(base, n, buf)"
+    )
+    _worker_profile = _build_worker(
+        True, setup=_worker_setup, wait=_worker_wait, batch="self._worker_batch(base, n, buf)"
+    )
+
+    def run(self):
+        """Write all blocks through the workers; returns the byte count."""
+        target = self._worker_profile if self.profile else self._worker_fast
+        pool = _shared_pool()
+        futures = [pool.submit(_guarded, self, target, i) for i in range(self.workers)]
+        try:
+            _futures_wait(futures)
+        except BaseException:
+            # Normal completion needs no quit signal, the wait alone reaps
+            # the work; only an interrupted wait asks the workers to bail out
+            self.stop()
+            _futures_wait(futures)
+            raise
+        if self._errors:
+            raise self._errors[0]
+        return self.count
+
+    def stop(self):
+        self._quit_ev.set()
+
+
+class MmapProducer(FdPwriteProducer):
+    """Fill a regular file through a shared memory mapping.
+
+    The file is sized up front and workers generate keystream straight into
+    the mapping, so the data is written with no syscalls at all and the
+    kernel handles writeback. One MADV_SEQUENTIAL hint at init replaces any
+    per-block madvise traffic, and page table entries behind the write
+    front are dropped in large batches. Requires a read-write fd.
+    """
+
+    MADVISE_INTERVAL = 64  # blocks between MADV_DONTNEED housekeeping
+
+    _worker_setup = ()
+    _worker_fast = _build_worker(
+        False, wait=FdPwriteProducer._worker_wait, batch="self._worker_batch(base, n, wid)"
+    )
+    _worker_profile = _build_worker(
+        True, wait=FdPwriteProducer._worker_wait, batch="self._worker_batch(base, n, wid)"
+    )
+
+    def __init__(self, fd, count, key, **kwargs):
+        super().__init__(fd, count, key, **kwargs)
+        end = self.start_offset + count
+        os.ftruncate(fd, end)
+        self.mm = mmap.mmap(fd, end)
+        self.mm.madvise(mmap.MADV_SEQUENTIAL)
+        self._view = memoryview(self.mm)
+        # DONTNEED offsets must be page aligned; skip the housekeeping for
+        # exotic block sizes rather than rounding
+        self._drop_pages = self.block_size % mmap.PAGESIZE == 0
+        # One counter per worker: each is written by its own thread only,
+        # so progress accounting needs no lock at all
+        self._written = [0] * self.workers
+
+    @property
+    def written(self):
+        """Bytes generated so far (momentary snapshot, monotonic)."""
+        return sum(self._written)
+
+    def _worker_batch(self, base, n, wid):
+        """Generate a batch straight into the mapping."""
+        start = self.start_offset + base * self.block_size
+        end = min(start + n * self.block_size, self.start_offset + self.count)
+        generate_into(self._view[start:end], self.key, self._nonces[base], rounds=self.rounds)
+        interval = self.MADVISE_INTERVAL
+        if self._drop_pages and base % interval == 0 and base > interval:
+            # Drop PTEs well behind the write front; the pages stay in the
+            # page cache so concurrent writers merely refault
+            self.mm.madvise(mmap.MADV_DONTNEED, 0, (base - interval) * self.block_size)
+        self._written[wid] += end - start
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            self._view.release()
+            self.mm.close()
+        return self.count
+
+
+class SequentialProducer:
+    """Single-threaded fallback: generate a block and write it, repeatedly.
+
+    No ring, no threads and no coordination; each block is two C calls
+    (generation already releases the GIL through cffi, so Cython would buy
+    nothing here). Selected with workers=0 when the caller wants the
+    stream without any thread machinery.
+    """
+
+    def __init__(self, fd, count, key, *, rounds=20, block_size=BLOCK_SIZE, **_):
+        assert block_size % CHA_BLOCK == 0
+        self.fd = fd
+        self.count = count
+        self.key = key
+        self.rounds = rounds
+        self.block_size = block_size
+        self.num_blocks = -(-count // block_size)
+        self._nonces = _make_nonces(self.num_blocks, block_size // CHA_BLOCK)
+
+    def run(self):
+        """Write all blocks in order; returns the byte count."""
+        view = memoryview(bytearray(self.block_size))
+        written = 0
+        for blkno in range(self.num_blocks):
+            chunk = view[: min(self.block_size, self.count - written)]
+            generate_into(chunk, self.key, self._nonces[blkno], rounds=self.rounds)
+            written += len(chunk)
+            while chunk:
+                chunk = chunk[os.write(self.fd, chunk) :]
+        return written
+
+
+def _producer_for(fd, count, key, **kwargs):
+    """Regular files take the direct pwrite path, everything else the ring."""
+    if kwargs.get("workers") == 0:
+        return SequentialProducer(fd, count, key, **kwargs)
+    if stat.S_ISREG(os.fstat(fd).st_mode):
+        return FdPwriteProducer(fd, count, key, **kwargs)
+    return FdProducer(fd, count, key, **kwargs)
+
+
+def fill(out, count: int, key, **kwargs):
+    """Write count random bytes to a path or an open file descriptor."""
+    if isinstance(out, (str, os.PathLike)):
+        fd = os.open(out, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            return _producer_for(fd, count, key, **kwargs).run()
+        finally:
+            os.close(fd)
+    return _producer_for(out, count, key, **kwargs).run()
@@ -5,14 +5,24 @@
 #define BATCH_BLOCKS 8
 #define BATCH_SIZE (BATCH_BLOCKS * CHA_BLOCK_SIZE)
 
+// Each SIMD kernel is compiled for its own ISA only; push/pop keeps the
+// target pragmas from leaking into the scalar fallback and the core API,
+// which must stay runnable on the baseline CPU for dispatch to matter.
 #if defined(__x86_64__)
 #ifdef __GNUC__
-#pragma GCC target("sse2")
-#pragma GCC target("ssse3")
-#pragma GCC target("avx2")
+#pragma GCC push_options
+#pragma GCC target("sse2,ssse3")
 #endif
 #include "cha4ssse3.h"
+#ifdef __GNUC__
+#pragma GCC pop_options
+#pragma GCC push_options
+#pragma GCC target("avx2")
+#endif
 #include "cha8avx2.h"
+#ifdef __GNUC__
+#pragma GCC pop_options
+#endif
 #elif defined(__aarch64__)
 #include "cha4neon.h"
 #endif
@@ -26,6 +36,7 @@
 #include <string.h>
 
 #include <pthread.h>
+#include <sched.h>
 #include <time.h>
 #include <unistd.h>
 
@@ -150,3 +161,95 @@ void cha_generate(
     cha_update(&ctx, out, outlen);
     cha_wipe(&ctx);
 }
+
+typedef struct cha_pool {
+    uint8_t* ring;
+    volatile uint8_t* ready;
+    volatile uint64_t* done_blkno;
+    volatile int* quit;
+    uint64_t block_size, num_slots, flag_stride, num_blocks, counter_step;
+    uint64_t next_blkno;
+    const uint8_t* key;
+    uint8_t iv[16];
+    unsigned rounds;
+} cha_pool;
+
+static void* _cha_pool_worker(void* arg) {
+    cha_pool* p = (cha_pool*)arg;
+    for (;;) {
+        uint64_t i = __atomic_fetch_add(&p->next_blkno, 1, __ATOMIC_RELAXED);
+        if (i >= p->num_blocks)
+            return NULL;
+        // Wait for the consumer to drain the slot from the previous lap
+        while (__atomic_load_n(p->done_blkno, __ATOMIC_ACQUIRE) + p->num_slots <= i) {
+            if (*p->quit)
+                return NULL;
+            sched_yield();
+        }
+        uint64_t slot = i % p->num_slots;
+        // The consumer clears the flag with a plain store before advancing
+        // done_blkno, without release ordering; wait until the clear is
+        // visible here so that this worker's ready=1 publish cannot be
+        // overwritten by it on weakly ordered CPUs (per-location coherence
+        // orders the two stores once the 0 has been observed)
+        while (__atomic_load_n(&p->ready[slot * p->flag_stride], __ATOMIC_ACQUIRE)) {
+            if (*p->quit)
+                return NULL;
+            sched_yield();
+        }
+        uint8_t iv[16];
+        memcpy(iv, p->iv, 16);
+        uint64_t counter;
+        memcpy(&counter, iv, 8);
+        counter += i * p->counter_step;
+        memcpy(iv, &counter, 8);
+        cha_generate(
+          p->ring + slot * p->block_size, p->block_size, p->key, iv, p->rounds
+        );
+        __atomic_store_n(&p->ready[slot * p->flag_stride], 1, __ATOMIC_RELEASE);
+    }
+}
+
+/// @brief Fill a ring of block_size slots from a pool of worker threads.
+/// Workers claim block numbers with an atomic fetch-add, busy-wait until the
+/// consumer has drained the slot (it advances *done_blkno as it goes), write
+/// the keystream of that block and publish the slot's ready flag with release
+/// semantics. Blocks until num_blocks are generated or *quit becomes nonzero.
+/// @param ring num_slots * block_size bytes of output
+/// @param ready one flag byte per slot, flag_stride bytes apart
+/// @param done_blkno count of blocks already drained, owned by the consumer
+/// @param quit set nonzero to terminate the pool early
+/// @param counter_step keystream blocks per ring block (block_size / 64)
+/// @return 0 on completion, -1 if threads could not be created
+int cha_fill_ring(
+  uint8_t* ring, uint64_t block_size, uint64_t num_slots, uint8_t* ready,
+  uint64_t flag_stride, uint64_t* done_blkno, int* quit, uint64_t num_blocks,
+  const uint8_t key[32], const uint8_t iv[16], uint64_t counter_step,
+  unsigned rounds, unsigned workers
+) {
+    cha_pool pool = {
+      .ring = ring,
+      .ready = ready,
+      .done_blkno = done_blkno,
+      .quit = quit,
+      .block_size = block_size,
+      .num_slots = num_slots,
+      .flag_stride = flag_stride,
+      .num_blocks = num_blocks,
+      .counter_step = counter_step,
+      .next_blkno = 0,
+      .key = key,
+      .rounds = rounds,
+    };
+    memcpy(pool.iv, iv, 16);
+    pthread_t threads[workers];
+    unsigned started = 0;
+    for (; started < workers; ++started) {
+        if (pthread_create(threads + started, NULL, _cha_pool_worker, &pool))
+            break;
+    }
+    for (unsigned i = 0; i < started; ++i) {
+        pthread_join(threads[i], NULL);
+    }
+    return started == workers ? 0 : -1;
+}
@@ -60,6 +60,22 @@ def test_cipherstreams_partial_updates():
         assert ct0.hex() == ct1.hex(), f"{i=} {N=}"
 
 
+def test_seek_offset():
+    """Seeking and the generate offset kwarg match slices of the full stream"""
+    key = token_bytes(32)
+    iv = token_bytes(8)  # zero initial counter, so tell() is the byte position
+    full = cha.generate(4096, key, iv)
+
+    for offset in [1, 63, 64, 65, 512, 1000]:
+        assert cha.generate(1024, key, iv, offset=offset) == full[offset : offset + 1024]
+        c = cha.Cha(key, iv)
+        c.seek(offset)
+        assert c(bytearray(100)) == full[offset : offset + 100]
+        assert c.tell() == offset + 100
+        c.seek(-50)
+        assert c(bytearray(50)) == full[offset + 50 : offset + 100]
+
+
 def test_cipherstreams_32leftover():
     """Test the special case where the second response comes entirely from the leftover buffer"""
     key = token_bytes(32)
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from secrets import token_bytes
+
+import pytest
+
+from randquik import cha, fill
+
+BS = 1 << 16  # small blocks so tests cover many ring rounds quickly
+
+
+def expected(count, key):
+    return bytes(cha.generate(count, key, bytes(8) + fill.DEFAULT_IV_TAIL))
+
+
+def test_ring_geometry():
+    """Slot count is a power of two and batches divide it evenly"""
+    fd = os.open(os.devnull, os.O_WRONLY)
+    try:
+        p = fill.FdProducer(fd, 10 * BS, token_bytes(32), block_size=BS, workers=3)
+        assert p.num_slots & (p.num_slots - 1) == 0
+        assert p._slot_mask == p.num_slots - 1
+        assert p.num_slots % p.claim_batch == 0
+        assert p.run() == 10 * BS
+    finally:
+        os.close(fd)
+
+
+def test_nonce_table():
+    """Precomputed IV rows match the per-block to_bytes construction"""
+    nonces = fill._make_nonces(10, 5)
+    for n in range(10):
+        assert bytes(nonces[n]) == (5 * n).to_bytes(8, "little") + fill.DEFAULT_IV_TAIL
+
+
+@pytest.mark.parametrize("count", [0, 1, BS - 1, BS, 3 * BS, 10 * BS + 17])
+def test_fill_file_matches_generate(tmp_path, count):
+    """Threaded output is the same stream as a single sequential generate"""
+    key = token_bytes(32)
+    path = tmp_path / "out.bin"
+    fill.fill(path, count, key, block_size=BS, workers=3)
+    assert path.read_bytes() == expected(count, key)
+
+
+@pytest.mark.parametrize("count", [1, 3 * BS, 7 * BS + 9])
+def test_pwrite_producer(tmp_path, count):
+    """Direct pwrite path for regular files produces the same stream"""
+    key = token_bytes(32)
+    path = tmp_path / "out.bin"
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        fill.FdPwriteProducer(fd, count, key, block_size=BS, workers=3).run()
+    finally:
+        os.close(fd)
+    assert path.read_bytes() == expected(count, key)
+
+
+@pytest.mark.parametrize("count", [1, 5 * BS, 9 * BS + 321])
+def test_mmap_producer(tmp_path, count):
+    """Mapped output produces the same stream and sizes the file correctly"""
+    key = token_bytes(32)
+    path = tmp_path / "out.bin"
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC)
+    try:
+        fill.MmapProducer(fd, count, key, block_size=BS, workers=3).run()
+    finally:
+        os.close(fd)
+    assert path.read_bytes() == expected(count, key)
+
+
+def test_sequential_producer(tmp_path):
+    """workers=0 takes the threadless path and produces the same stream"""
+    key = token_bytes(32)
+    count = 3 * BS + 7
+    path = tmp_path / "out.bin"
+    fill.fill(path, count, key, block_size=BS, workers=0)
+    assert path.read_bytes() == expected(count, key)
+
+
+def test_fill_pipe(tmp_path):
+    """Non-seekable outputs take the sequential write path"""
+    key = token_bytes(32)
+    count = 5 * BS + 123
+    r, w = os.pipe()
+    chunks = []
+
+    def drain():
+        while data := os.read(r, 1 << 20):
+            chunks.append(data)
+
+    t = threading.Thread(target=drain)
+    t.start()
+    try:
+        fill.fill(w, count, key, block_size=BS, workers=2)
+    finally:
+        os.close(w)
+    t.join()
+    os.close(r)
+    assert b"".join(chunks) == expected(count, key)
+
+
+def test_fill_pipe_slow_reader(monkeypatch):
+    """Pipe output is copied, never spliced: a slow reader must still see
+    each block's original bytes after the ring slot has been reused"""
+    monkeypatch.setattr(fill, "MAX_RING_BYTES", 8 * BS)  # lap the ring often
+    key = token_bytes(32)
+    count = 64 * BS
+    r, w = os.pipe()
+    chunks = []
+
+    def drain():
+        while data := os.read(r, BS):
+            chunks.append(data)
+            time.sleep(0.001)  # let workers lap the ring before we read on
+
+    t = threading.Thread(target=drain)
+    t.start()
+    try:
+        fill.fill(w, count, key, block_size=BS, workers=4, profile=True)
+    finally:
+        os.close(w)
+    t.join()
+    os.close(r)
+    assert b"".join(chunks) == expected(count, key)
+
+
+def test_pwrite_error_propagates(tmp_path):
+    """A failing write surfaces as an error instead of reported success"""
+    key = token_bytes(32)
+    path = tmp_path / "out.bin"
+    fd = os.open(path, os.O_RDONLY | os.O_CREAT)  # pwrite must fail
+    try:
+        with pytest.raises(OSError):
+            fill.FdPwriteProducer(fd, 3 * BS, key, block_size=BS, workers=2).run()
+    finally:
+        os.close(fd)
+
+
+def test_ring_worker_error_propagates():
+    """A raised ring worker stops the run and re-raises instead of hanging"""
+    class Boom(fill.FdProducer):
+        def _worker_batch(self, base, n):
+            raise RuntimeError("boom")
+
+    fd = os.open(os.devnull, os.O_WRONLY)
+    try:
+        with pytest.raises(RuntimeError):  # profile=True forces Python workers
+            Boom(fd, 4 * BS, token_bytes(32), block_size=BS, workers=2, profile=True).run()
+    finally:
+        os.close(fd)
+
+
+def test_fill_profile(tmp_path):
+    """Profiled runs collect per-thread stats and produce identical output"""
+    key = token_bytes(32)
+    count = 8 * BS
+    path = tmp_path / "out.bin"
+    p = None
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        p = fill.FdProducer(fd, count, key, block_size=BS, workers=2, profile=True)
+        p.run()
+    finally:
+        os.close(fd)
+    assert path.read_bytes() == expected(count, key)
+    assert sum(w.blocks for w in p.worker_stats) == count // BS
+    assert p.consumer_stats.blocks == count // BS
+    assert fill.format_worker_stats_report(p.worker_stats, p.consumer_stats)